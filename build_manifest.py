@@ -0,0 +1,161 @@
+from pathlib import Path
+from contextlib import contextmanager
+
+import os
+import json
+import fcntl
+import socket
+import hashlib
+import threading
+
+MANIFEST_PATH = Path("./DB") / "manifest.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+# Los locks de fcntl son por proceso, no por hilo: un threading.Lock por ruta
+# serializa los hilos de un mismo proceso antes de tomar el lock del archivo.
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+def _thread_lock(path: Path) -> threading.Lock:
+    """threading.Lock compartido por todos los hilos para una misma ruta."""
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(str(path.resolve()), threading.Lock())
+
+@contextmanager
+def file_lock(path: Path):
+    """Lock consultivo exclusivo sobre `path`, válido entre hilos, procesos y nodos."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _thread_lock(path), path.open("a") as f:
+        fcntl.lockf(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.lockf(f, fcntl.LOCK_UN)
+
+def tmp_path(path) -> Path:
+    """Ruta temporal oculta junto a `path`, única por nodo y proceso; conserva la extensión."""
+    path = Path(path)
+    return path.with_name(f".{path.stem}.{socket.gethostname()}-{os.getpid()}.tmp{path.suffix}")
+
+def read_json(path):
+    """Lee un JSON, o None si no existe o está dañado."""
+    path = Path(path)
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"[JSON] No se pudo leer '{path}', se ignora: {e}")
+        return None
+
+def write_json(path, data, **dump_args):
+    """Escribe un JSON de forma atómica (archivo temporal + rename)."""
+    path = Path(path)
+    tmp_file = tmp_path(path)
+    with tmp_file.open("w", encoding="utf-8") as f:
+        json.dump(data, f, **dump_args)
+    os.replace(tmp_file, path)
+
+def merge_json(path, changes: dict, read, dump, **dump_args) -> dict:
+    """Aplica `changes` sobre la versión en disco de un JSON compartido.
+
+    Bajo el lock de `path`, vuelve a leer el contenido con `read`, aplica
+    cada clave de `changes` (None la borra) y lo reescribe con `dump` de
+    forma atómica. Devuelve el contenido resultante.
+    """
+    path = Path(path)
+    with file_lock(path.with_suffix(".lock")):
+        items = read(path)
+        for key, value in changes.items():
+            if value is None:
+                items.pop(key, None)
+            else:
+                items[key] = value
+        write_json(path, dump(items), **dump_args)
+    return items
+
+def _file_hash(path: Path) -> str:
+    """Calcula el hash SHA-1 del contenido de un archivo."""
+    digest = hashlib.sha1()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """Manifiesto de artefactos generados con la firma de sus entradas.
+
+    Cada entrada guarda, para un artefacto, la versión de la herramienta o
+    configuración que lo produjo y la firma (tamaño, mtime y hash) de cada
+    archivo de entrada. Un artefacto está al día si nada de eso ha cambiado;
+    el hash solo se recalcula cuando el tamaño o el mtime no coinciden.
+
+    Varios procesos pueden compartir el manifiesto: al guardar, solo se
+    aplican sobre la versión en disco las entradas que cambió este proceso.
+    """
+
+    def __init__(self, path: Path = MANIFEST_PATH):
+        """Carga el manifiesto desde disco, o empieza uno vacío."""
+        self.path = Path(path)
+        self.entries = read_json(self.path) or {}
+        self._changes = {}
+
+    def _signature(self, path: Path, known: dict = None) -> dict:
+        """Firma de un archivo; reutiliza el hash conocido si el stat no cambió."""
+        stat = path.stat()
+        if known and known.get("size") == stat.st_size and known.get("mtime_ns") == stat.st_mtime_ns:
+            return known
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": _file_hash(path)}
+
+    def _matches(self, path: Path, known: dict, target: str) -> bool:
+        """Comprueba si un archivo coincide con su firma guardada."""
+        if not known or not path.exists():
+            return False
+        signature = self._signature(path, known)
+        if signature["sha1"] != known.get("sha1"):
+            return False
+        if signature is not known:
+            # Mismo contenido con otro mtime: se actualiza para no volver a hashear.
+            known.update(signature)
+            self._changes[target] = self.entries[target]
+        return True
+
+    def is_fresh(self, target, inputs=(), version="") -> bool:
+        """Indica si `target` está al día respecto a `inputs` y `version`."""
+        entry = self.entries.get(str(target))
+        if entry is None or entry.get("version") != version:
+            return False
+        if sorted(entry["inputs"]) != sorted(str(p) for p in inputs):
+            return False
+        if not self._matches(Path(target), entry["target"], str(target)):
+            return False
+        return all(self._matches(Path(p), entry["inputs"][str(p)], str(target)) for p in inputs)
+
+    def record(self, target, inputs=(), version=""):
+        """Registra `target` como generado a partir de `inputs` con `version`."""
+        previous = self.entries.get(str(target), {})
+        known_inputs = previous.get("inputs", {})
+        self.entries[str(target)] = {
+            "version": version,
+            "target": self._signature(Path(target)),
+            "inputs": {str(p): self._signature(Path(p), known_inputs.get(str(p))) for p in inputs},
+        }
+        self._changes[str(target)] = self.entries[str(target)]
+
+    def forget(self, target):
+        """Elimina la entrada de un artefacto que ya no existe."""
+        if self.entries.pop(str(target), None) is not None:
+            self._changes[str(target)] = None
+
+    def save(self):
+        """Escribe de forma atómica los cambios sobre la versión en disco."""
+        if not self._changes:
+            return
+        entries = merge_json(self.path, self._changes, lambda path: read_json(path) or {},
+                             lambda entries: entries, indent=1, sort_keys=True)
+        self.entries = entries
+        self._changes = {}
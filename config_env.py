@@ -1,16 +1,32 @@
-from moviepy.editor import VideoFileClip, CompositeVideoClip, vfx
 from pathlib import Path
 from dataclasses import dataclass
+from build_manifest import BuildManifest, tmp_path
+from video_features import FeatureIndex, analyze_video, FEATURES_VERSION
 
 import os
 import json
 import pickle
 
-import whisper_timestamped
-WM = whisper_timestamped.load_model("small", device = "cpu")
-
+WHISPER_MODEL_NAME = "small"
 RESOLUTION = 9/16
 
+# Versiones de cada etapa: cambiarlas invalida los artefactos del manifiesto.
+CAPTION_VERSION = f"whisper_timestamped:{WHISPER_MODEL_NAME}"
+RESIZE_VERSION = "1080x1920:libx264"
+# Un video está al día cuando está normalizado y sus features están en el índice
+VIDEO_VERSION = f"{RESIZE_VERSION}:{FEATURES_VERSION}"
+DOWNLOAD_VERSION = "yt-dlp"
+
+_whisper_model = None
+
+def _load_whisper_model():
+    """Carga el modelo de Whisper solo cuando hay audios por transcribir."""
+    global _whisper_model
+    if _whisper_model is None:
+        import whisper_timestamped
+        _whisper_model = whisper_timestamped.load_model(WHISPER_MODEL_NAME, device = "cpu")
+    return _whisper_model
+
 @dataclass
 class accountConfig:
     """Generador de videos cortos para plataformas sociales"""
@@ -22,6 +38,7 @@ class accountConfig:
         self.videos_links_path = Path("./Links") / f'{account["edition"]["type"]}_{account["edition"]["content"]}.csv'
         self.audio_db_path = Path("./DB") / f"audio_{account['language']}.csv"
         self.videos_db_path = Path("./DB") / f'{account["edition"]["type"]}_{account["edition"]["content"]}.csv'
+        self.features_index_path = Path("./DB") / f'{account["edition"]["type"]}_{account["edition"]["content"]}_features.json'
         self.audio_folder_path = Path("./Media") / account["type"] / "Audios" / account["language"]
         self.video_folder_path = Path("./Media") / account["type"] / account["edition"]["type"] / account["edition"]["content"]
         self.caption_folder_path = Path("./Media") / account["type"] / "Captions" / account["language"]
@@ -65,20 +82,24 @@ def write_folders(accounts):
         _create_folder(media_path / account["edition"]["type"] / account["edition"]["content"])
         _create_folder(media_path / "Captions" / account["language"])
 
-def download_media(accounts):  
+def download_media(accounts, manifest):  
     for account in accounts:
         config = accountConfig(account)
         missing_audio = []
         missing_videos = []
 
-        if config.audio_links_path.exists() and config.audio_db_path.exists():
+        # El DB de cada lista depende de su archivo de links: si no cambió desde la última descarga, no hay nada que bajar
+        audio_fresh = manifest.is_fresh(config.audio_db_path, [config.audio_links_path], DOWNLOAD_VERSION)
+        videos_fresh = manifest.is_fresh(config.videos_db_path, [config.videos_links_path], DOWNLOAD_VERSION)
+
+        if not audio_fresh and config.audio_links_path.exists() and config.audio_db_path.exists():
             with config.audio_links_path.open("r", encoding="utf-8") as f_links, \
                  config.audio_db_path.open("r", encoding="utf-8") as f_db:
                 links = set(line.strip() for line in f_links if line.strip() and line.strip() != "video_id")
                 db = set(line.strip() for line in f_db if line.strip() and line.strip() != "video_id")
                 missing_audio = links - db
 
-        if config.videos_links_path.exists() and config.videos_db_path.exists():
+        if not videos_fresh and config.videos_links_path.exists() and config.videos_db_path.exists():
             with config.videos_links_path.open("r", encoding="utf-8") as f_links, \
                  config.videos_db_path.open("r", encoding="utf-8") as f_db:
                 links = set(line.strip() for line in f_links if line.strip() and line.strip() != "video_id")
@@ -119,62 +140,121 @@ def download_media(accounts):
             with config.videos_db_path.open("a", encoding="utf-8") as db_file:
                 for vidio_id in missing_videos:
                     db_file.write(f"{vidio_id}\n")
+
+        if not audio_fresh and config.audio_links_path.exists() and config.audio_db_path.exists():
+            manifest.record(config.audio_db_path, [config.audio_links_path], DOWNLOAD_VERSION)
+        if not videos_fresh and config.videos_links_path.exists() and config.videos_db_path.exists():
+            manifest.record(config.videos_db_path, [config.videos_links_path], DOWNLOAD_VERSION)
     
     for account in accounts:
         config = accountConfig(account)
-        audio_files = [str(f) for f in config.audio_folder_path.iterdir() if f.is_file()]
-        for audio_file in audio_files:
-            if audio_file.endswith("mp3"):
-                cmd = f"ffmpeg -i {audio_file} {audio_file.replace('.mp3', '.wav')}"
-                os.system(cmd)
-                os.remove(audio_file)
-
-def audios_to_pickle(accounts, whisper_model=WM, txt_format="segments"):
+        for audio_file in media_files(config.audio_folder_path):
+            if audio_file.endswith(".mp3"):
+                convert_to_wav(audio_file)
+
+def media_files(folder: Path):
+    """Archivos de una carpeta de media, sin los temporales ocultos."""
+    return [str(f) for f in folder.iterdir() if f.is_file() and not f.name.startswith(".")]
+
+def convert_to_wav(audio_file) -> str:
+    """Convierte un mp3 descargado a wav, que es lo que se transcribe, y borra el mp3."""
+    audio_file = Path(audio_file)
+    wav_file = audio_file.with_suffix(".wav")
+    tmp_wav_file = tmp_path(wav_file)
+    if os.system(f'ffmpeg -y -i "{audio_file}" "{tmp_wav_file}"') != 0:
+        raise RuntimeError(f"ffmpeg no pudo convertir '{audio_file}'")
+    os.replace(tmp_wav_file, wav_file)
+    os.remove(audio_file)
+    return str(wav_file)
+
+def transcribe_audio(config, audio_file: Path, manifest, whisper_model=None, txt_format="segments"):
+    """Transcribe un audio a su caption si esta no está al día con él."""
+    audio_file = Path(audio_file)
+    caption_file = config.caption_folder_path / audio_file.name.replace(".wav", ".pickle")
+    version = f"{CAPTION_VERSION}:{txt_format}:{config.language}"
+    if manifest.is_fresh(caption_file, [audio_file], version):
+        return
+
+    # Captions creadas antes del manifiesto: se registran con su audio actual en lugar de volver a transcribir
+    if caption_file.exists() and str(caption_file) not in manifest.entries:
+        print(f"[Caption] Registrando en el manifiesto el archivo existente '{caption_file}'.")
+        manifest.record(caption_file, [audio_file], version)
+        return
+
+    import whisper_timestamped
+    if whisper_model is None:
+        whisper_model = _load_whisper_model()
+    whisper_audio = whisper_timestamped.load_audio(str(audio_file))
+    whisper_results = whisper_timestamped.transcribe(whisper_model, whisper_audio, language=config.language)
+    whisper_transcribed_text = whisper_results[txt_format]
+
+    print(f"[Caption] Guardando el archivo '{caption_file}'.")
+    tmp_caption_file = tmp_path(caption_file)
+    with (tmp_caption_file).open("wb") as f:
+        pickle.dump(whisper_transcribed_text, f)
+    os.replace(tmp_caption_file, caption_file)
+    manifest.record(caption_file, [audio_file], version)
+
+def audios_to_pickle(accounts, manifest, whisper_model=None, txt_format="segments"):
     # Leer todos los archivos en audio_path y crear una lista
 
     for account in accounts:
         config = accountConfig(account)
 
-        audio_files = [str(f) for f in config.audio_folder_path.iterdir() if f.is_file()]
-        caption_files = [str(f) for f in config.caption_folder_path.iterdir() if f.is_file()]
-
-        id_names = [f.split('/')[-1] for f in audio_files]
-
-        # Verificar que todos los id_names tengan su archivo de caption correspondiente
-        for audio_id in id_names:
-            caption_file = config.caption_folder_path / audio_id.replace(".wav", ".pickle")
-            if str(caption_file) not in caption_files:
-                whisper_audio = whisper_timestamped.load_audio(str(config.audio_folder_path / audio_id))
-                whisper_results = whisper_timestamped.transcribe(whisper_model, whisper_audio, language=config.language)
-                whisper_transcribed_text = whisper_results[txt_format]
-
-                print(f"[Caption] Guardando el archivo '{caption_file}'.")
-                with (caption_file).open("wb") as f:
-                    pickle.dump(whisper_transcribed_text, f)
+        # Verificar que todos los audios tengan su caption al día (solo se transcriben los wav)
+        for audio_file in media_files(config.audio_folder_path):
+            if audio_file.endswith(".wav"):
+                transcribe_audio(config, audio_file, manifest, whisper_model, txt_format)
         
         # Verificar que todos los archivos de caption tengan su archivo de audio correspondiente
         for caption_file in config.caption_folder_path.iterdir():
-            if caption_file.suffix == ".pickle":
+            if caption_file.suffix == ".pickle" and not caption_file.name.startswith("."):
                 audio_file = config.audio_folder_path / caption_file.stem.replace(".wav", "")  # stem sin extensión
                 audio_file = audio_file.with_suffix(".wav")
                 if not audio_file.exists():
                     print(f"[Caption] '{caption_file}' no tiene su archivo de audio correspondiente.")
                     os.remove(caption_file)
-
-def resize_video(accounts_config):
+                    manifest.forget(caption_file)
+
+def normalize_video(video_file, manifest, feature_index):
+    """Lleva un video a 1080x1920 y analiza sus features si no está al día."""
+    video_file = str(video_file)
+    # El video se normaliza en el mismo archivo: si no cambió desde la última vez, ya está listo
+    if manifest.is_fresh(video_file, version=VIDEO_VERSION):
+        return
+
+    from moviepy.editor import VideoFileClip, vfx
+    video_file_clip = VideoFileClip(video_file).without_audio()
+    resolution = video_file_clip.w / video_file_clip.h
+    if resolution != RESOLUTION or str(video_file_clip.w) != '1080':
+        print(f"[Vidio] Resizing video '{video_file}'.")
+        output_path = str(tmp_path(video_file))
+        video_resized = video_file_clip.fx(vfx.resize, (1080, 1920))
+        video_resized.write_videofile(output_path, codec="libx264", audio=False)
+        os.replace(output_path, video_file)
+    video_file_clip.close()
+
+    print(f"[Features] Analizando video '{video_file}'.")
+    feature_index.set(video_file, analyze_video(video_file))
+    manifest.record(video_file, version=VIDEO_VERSION)
+
+def resize_video(accounts_config, manifest):
     for account in accounts_config:
         config = accountConfig(account)
-        videos_files = [str(f) for f in config.video_folder_path.iterdir() if f.is_file()]
-        for video_file in videos_files:
-            video_file_clip = VideoFileClip(video_file).without_audio()
-            resolution = video_file_clip.w / video_file_clip.h
-            if resolution != RESOLUTION or str(video_file_clip.w) != '1080':
-                print(f"[Vidio] Resizing video '{video_file}'.")
-                output_path = str(Path(video_file).with_stem(Path(video_file).stem + "_resized"))
-                video_resized = video_file_clip.fx(vfx.resize, (1080, 1920))
-                video_resized.write_videofile(output_path, codec="libx264", audio=False)
-                os.remove(video_file)
-                os.rename(output_path, video_file)
+        videos_files = media_files(config.video_folder_path)
+        # El índice de features depende de los videos de su carpeta: si ninguno cambió, basta con hacer stat
+        if manifest.is_fresh(config.features_index_path, videos_files, FEATURES_VERSION):
+            continue
+
+        feature_index = FeatureIndex(config.features_index_path)
+        feature_index.prune(videos_files)
+        try:
+            for video_file in videos_files:
+                normalize_video(video_file, manifest, feature_index)
+        finally:
+            feature_index.save()
+        if config.features_index_path.exists():
+            manifest.record(config.features_index_path, videos_files, FEATURES_VERSION)
 
 
 def clean_db(archivo):
@@ -187,10 +267,16 @@ def clean_db(archivo):
         raise RuntimeError(f"Error leyendo configuración: {e}")
 
     write_folders(accounts_config)
-    download_media(accounts_config)
-    audios_to_pickle(accounts_config)
-    resize_video(accounts_config)
+
+    manifest = BuildManifest()
+    try:
+        download_media(accounts_config, manifest)
+        audios_to_pickle(accounts_config, manifest)
+        resize_video(accounts_config, manifest)
+    finally:
+        manifest.save()
 
 
-config_file = "./Config/config.json"
-clean_db(config_file)
\ No newline at end of file
+if __name__ == "__main__":
+    config_file = "./Config/config.json"
+    clean_db(config_file)
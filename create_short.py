@@ -2,8 +2,28 @@ from moviepy.editor import *
 from pathlib import Path
 from dataclasses import dataclass
 from random import randint
+from build_manifest import BuildManifest, tmp_path, write_json
+from video_features import FeatureIndex, window_penalty
 
+import sys
 import json
+import os
+import uuid
+import hashlib
+
+# Cambiar SEGMENTS_VERSION cada vez que cambie la forma de elegir segmentos
+SEGMENTS_VERSION = "features-v2"
+SHORT_VERSION = f"concat:libx264:aac:ultrafast:{SEGMENTS_VERSION}"
+SEGMENT_ATTEMPTS = 20
+MIN_SEGMENT_DURATION = 5
+MAX_SEGMENT_DURATION = 10
+
+# Modo preview: mismo plan de composición, a baja resolución y fps
+PREVIEW = "--preview" in sys.argv
+# Ignora el plan guardado y sortea segmentos nuevos
+NEW_PLAN = "--new-plan" in sys.argv
+PREVIEW_RESOLUTION = (480, 270)  # (alto, ancho), como espera target_resolution
+PREVIEW_FPS = 15
 
 
 @dataclass
@@ -12,21 +32,25 @@ class accountConfig:
     
     def __init__(self, account):
         """Inicializa el generador con la configuración proporcionada"""
+        self.name = account["name"]
         self.language = account["language"]
         self.audio_links_path = Path("./Links") / f"audio_{account['language']}.csv"
         self.videos_links_path = Path("./Links") / f'{account["edition"]["type"]}_{account["edition"]["content"]}.csv'
         self.audio_db_path = Path("./DB") / f"audio_{account['language']}.csv"
         self.videos_db_path = Path("./DB") / f'{account["edition"]["type"]}_{account["edition"]["content"]}.csv'
+        self.features_index_path = Path("./DB") / f'{account["edition"]["type"]}_{account["edition"]["content"]}_features.json'
         self.audio_folder_path = Path("./Media") / account["type"] / "Audios" / account["language"]
         self.video_folder_path = Path("./Media") / account["type"] / account["edition"]["type"] / account["edition"]["content"]
         self.caption_folder_path = Path("./Media") / account["type"] / "Captions" / account["language"]
 
 """
+self.name
 self.language
 self.audio_links_path
 self.videos_links_path
 self.audio_db_path
 self.videos_db_path
+self.features_index_path
 self.audio_folder_path
 self.video_folder_path
 self.caption_folder_path
@@ -34,43 +58,193 @@ self.caption_folder_path
 
 
 
-archivo = "./Config/config.json"
+CONFIG_FILE = "./Config/config.json"
+
+def load_accounts(archivo=CONFIG_FILE):
+    """Lee la lista de cuentas del archivo de configuración."""
+    try:
+        print(f"[Config] Cargando configuración para '{archivo}'")
+
+        with open(archivo, 'r', encoding='utf-8') as config_file:
+            return json.load(config_file)
+    except Exception as e:
+        raise RuntimeError(f"Error leyendo configuración: {e}")
+
+def _commit(tmp_file_path, final_path):
+    """Publica un archivo renderizado de forma atómica."""
+    os.replace(tmp_file_path, final_path)
+    return True
+
+def choose_segments(files, feature_index):
+    """Elige al azar el segmento de cada video que formará el short.
+
+    Si el video tiene features en el índice, las ventanas se sortean dentro de
+    su duración y se queda la de menos defectos (negra, estática, repetida o
+    empezando en un corte), sin decodificar ningún frame.
+    """
+    segments = []
+    used_hashes = set()
+    for file in files:
+        seconds = feature_index.get(file)
+        if not seconds:
+            start_time = randint(2,10)
+            duration = randint(MIN_SEGMENT_DURATION, MAX_SEGMENT_DURATION)
+            segments.append({"file": file, "start": start_time, "duration": duration})
+            continue
+
+        # El último segundo puede estar incompleto: solo se usan segundos enteros
+        length = len(seconds) - 1
+        if length < MIN_SEGMENT_DURATION:
+            print(f" --> '{file}' dura menos de {MIN_SEGMENT_DURATION}s, se omite")
+            continue
+
+        best = None
+        for _ in range(SEGMENT_ATTEMPTS):
+            duration = randint(MIN_SEGMENT_DURATION, min(MAX_SEGMENT_DURATION, length))
+            start_time = randint(0, length - duration)
+            penalty = window_penalty(seconds, start_time, duration, used_hashes)
+            if best is None or penalty < best[0]:
+                best = (penalty, start_time, duration)
+            if penalty == 0:
+                break
+
+        penalty, start_time, duration = best
+        if penalty:
+            print(f" --> Sin ventana limpia en '{file}', se usa la de menos defectos ({penalty})")
+        used_hashes.update(s["phash"] for s in seconds[start_time:start_time + duration])
+        segments.append({"file": file, "start": start_time, "duration": duration})
+    return segments
+
+def draw_plan(files, feature_index, plan_id=None):
+    """Crea un plan nuevo, con su propio id, para un short."""
+    return {"id": plan_id or uuid.uuid4().hex[:8], "segments": choose_segments(files, feature_index)}
 
-try:
-    print(f"[Config] Cargando configuración para '{archivo}'")
+def load_plan(plan_path: Path):
+    """Carga el plan guardado por un preview, o None si no hay ninguno."""
+    try:
+        with plan_path.open("r", encoding="utf-8") as f:
+            plan = json.load(f)
+    except FileNotFoundError:
+        return None
+    missing = [segment["file"] for segment in plan["segments"] if not Path(segment["file"]).exists()]
+    if missing:
+        raise FileNotFoundError(f"El plan '{plan_path}' usa videos que ya no existen: {missing}. "
+                                f"Usa --new-plan para sortear otro o borra el plan.")
+    print(f"[Plan] Reutilizando el plan '{plan_path}'")
+    return plan
 
-    with open(archivo, 'r', encoding='utf-8') as config_file:
-        accounts_config = json.load(config_file)
-except Exception as e:
-    raise RuntimeError(f"Error leyendo configuración: {e}")
+def save_plan(plan_path: Path, plan):
+    """Guarda el plan para que el render final reproduzca el preview."""
+    write_json(plan_path, plan, indent=4)
+    print(f"[Plan] Guardando el plan '{plan_path}'")
 
-def get_concatenation_clips(files):
+def _plan_version(plan) -> str:
+    """Versión del short: ajustes de render más el contenido de su plan."""
+    segments = json.dumps(plan["segments"], sort_keys=True).encode("utf-8")
+    return f"{SHORT_VERSION}:{hashlib.sha1(segments).hexdigest()[:12]}"
+
+def get_concatenation_clips(segments, target_resolution=None):
     print("")
     
     clips_list = []
-    for file in files:
-        start_time = randint(2,10)
-        duration = randint(5,10)
-        clip = VideoFileClip(file).subclip(start_time, start_time + duration)
+    for segment in segments:
+        start_time = segment["start"]
+        duration = segment["duration"]
+        clip = VideoFileClip(segment["file"], audio=False, target_resolution=target_resolution)
+        clip = clip.subclip(start_time, start_time + duration)
         clips_list.append(clip)
-        print(f" --> Selecting '{file}' '{duration}'")
+        print(f" --> Selecting '{segment['file']}' '{duration}'")
     
     print("")
     return concatenate_videoclips(clips_list, method="compose").without_audio()
 
-for user_config in accounts_config:
+def render_account(user_config, manifest, preview=False, new_plan=False, plan_id=None, commit=_commit):
+    """Renderiza el short (o su preview) de una cuenta.
+
+    El video se escribe en un archivo temporal y se publica con `commit`, que
+    debe moverlo a su ruta final de forma atómica y devolver False si el
+    resultado ya no debe publicarse (por ejemplo, si se perdió el lease).
+    Con `new_plan` se ignora el plan guardado y se sortean segmentos nuevos;
+    `plan_id` es el id del plan que se sortee (uno al azar si no se indica).
+    """
     account = accountConfig(user_config)
 
-    files = [str(f) for f in account.video_folder_path.iterdir() if f.is_file()]
-    if not files: continue
-
-    concatenation = get_concatenation_clips(files)
-    concatenation.write_videofile(
-        "output/output_file_path.mp4", 
-        codec="libx264", 
-        audio_codec="aac", 
-        fps=concatenation.fps, 
-        threads=4, 
-        preset="ultrafast",
-        remove_temp=True
-    ) 
+    files = sorted(str(f) for f in account.video_folder_path.iterdir() if f.is_file() and not f.name.startswith("."))
+    if not files: return
+    feature_index = FeatureIndex(account.features_index_path)
+
+    plan_path = Path("output") / f"{account.name}.plan.json"
+    plan = None if new_plan else load_plan(plan_path)
+    plan_loaded = plan is not None
+    # Cada plan es un short distinto: sin plan guardado se sortea uno nuevo, con salida propia
+    if plan is None:
+        plan = draw_plan(files, feature_index, plan_id)
+    if not plan["segments"]:
+        print(f"[Short] '{account.name}' no tiene videos utilizables, se omite.")
+        return
+
+    if preview:
+        preview_file_path = f"output/{account.name}_{plan['id']}_preview.mp4"
+        tmp_file_path = str(tmp_path(preview_file_path))
+        concatenation = get_concatenation_clips(plan["segments"], target_resolution=PREVIEW_RESOLUTION)
+        concatenation.write_videofile(
+            tmp_file_path,
+            codec="libx264",
+            fps=PREVIEW_FPS,
+            threads=4,
+            preset="ultrafast",
+            ffmpeg_params=["-tune", "fastdecode,zerolatency", "-crf", "35"],
+            remove_temp=True
+        )
+        if not commit(tmp_file_path, preview_file_path):
+            os.remove(tmp_file_path)
+            return
+        # El plan solo se guarda si el preview llegó a publicarse
+        save_plan(plan_path, plan)
+        print(f"[Preview] '{preview_file_path}' listo; el render final usará el mismo plan.")
+        return
+
+    output_file_path = f"output/{account.name}_{plan['id']}.mp4"
+    inputs = sorted({segment["file"] for segment in plan["segments"]})
+    if account.features_index_path.exists():
+        inputs.append(str(account.features_index_path))
+
+    if manifest.is_fresh(output_file_path, inputs, _plan_version(plan)):
+        print(f"[Short] '{output_file_path}' ya está renderizado con este plan, se omite.")
+    else:
+        tmp_file_path = str(tmp_path(output_file_path))
+        concatenation = get_concatenation_clips(plan["segments"])
+        concatenation.write_videofile(
+            tmp_file_path, 
+            codec="libx264", 
+            audio_codec="aac", 
+            fps=concatenation.fps, 
+            threads=4, 
+            preset="ultrafast",
+            remove_temp=True
+        )
+        if not commit(tmp_file_path, output_file_path):
+            os.remove(tmp_file_path)
+            return
+        manifest.record(output_file_path, inputs, _plan_version(plan))
+        manifest.save()
+
+    # El plan ya se consumió: el siguiente short elegirá segmentos nuevos
+    if plan_loaded:
+        try:
+            os.remove(plan_path)
+        except FileNotFoundError:
+            pass  # otro proceso ya lo consumió
+
+def create_short(accounts_config, preview=False, new_plan=False):
+    manifest = BuildManifest()
+    for user_config in accounts_config:
+        # Un plan con videos borrados no debe impedir el short de las demás cuentas
+        try:
+            render_account(user_config, manifest, preview=preview, new_plan=new_plan)
+        except FileNotFoundError as e:
+            print(f"[Plan] Se omite '{user_config['name']}': {e}")
+
+
+if __name__ == "__main__":
+    create_short(load_accounts(), preview=PREVIEW, new_plan=NEW_PLAN)
@@ -0,0 +1,136 @@
+from pathlib import Path
+from build_manifest import file_lock, read_json, write_json
+
+import os
+import time
+import uuid
+
+QUEUE_PATH = Path("./DB") / "Queue"
+LEASE_SECONDS = 600
+MAX_ATTEMPTS = 3
+
+
+class JobQueue:
+    """Cola de trabajos sobre el sistema de archivos compartido.
+
+    Cada trabajo es un JSON que pasa por las carpetas pending/, leases/,
+    done/ y failed/. Un worker toma un trabajo escribiendo un lease con su
+    token y una fecha de expiración que renueva mientras trabaja; si el lease
+    expira, cualquier otro worker lo devuelve a pending/. Un trabajo con
+    `requires` no se toma hasta que esos trabajos salgan de pending/ y
+    leases/. Todos los cambios de estado se hacen bajo un lock consultivo
+    común, así que el sistema de archivos compartido debe soportar locks
+    POSIX (fcntl).
+    """
+
+    def __init__(self, path: Path = QUEUE_PATH, lease_seconds: int = LEASE_SECONDS):
+        """Crea las carpetas de la cola si no existen."""
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.lock_path = self.path / ".lock"
+        self.pending_path = self.path / "pending"
+        self.leases_path = self.path / "leases"
+        self.done_path = self.path / "done"
+        self.failed_path = self.path / "failed"
+        for folder in (self.pending_path, self.leases_path, self.done_path, self.failed_path):
+            folder.mkdir(parents=True, exist_ok=True)
+
+    def _is_active(self, job_id: str) -> bool:
+        """Indica si un trabajo está pendiente o en curso (llamar con el lock tomado)."""
+        return (self.pending_path / f"{job_id}.json").exists() or (self.leases_path / f"{job_id}.json").exists()
+
+    def enqueue(self, job_id: str, kind: str, requires=(), **params) -> bool:
+        """Encola un trabajo; devuelve False si ya está pendiente o en curso.
+
+        `requires` son ids de trabajos que deben terminar antes de que este
+        pueda tomarse; `params` se guardan en el trabajo para el worker.
+        """
+        with file_lock(self.lock_path):
+            if self._is_active(job_id):
+                return False
+            job = {"id": job_id, "kind": kind, "requires": list(requires), "attempts": 0, **params}
+            write_json(self.pending_path / f"{job_id}.json", job, indent=4)
+        print(f"[Queue] Trabajo '{job_id}' encolado.")
+        return True
+
+    def _retry_or_fail(self, job, error: str):
+        """Devuelve el trabajo a pending/, o lo pasa a failed/ tras MAX_ATTEMPTS (con el lock tomado)."""
+        job["error"] = error
+        folder = self.failed_path if job["attempts"] >= MAX_ATTEMPTS else self.pending_path
+        write_json(folder / f"{job['id']}.json", job, indent=4)
+
+    def reclaim_expired(self):
+        """Devuelve a pending/ (o a failed/) los trabajos cuyo lease expiró."""
+        now = time.time()
+        with file_lock(self.lock_path):
+            for lease_file in self.leases_path.glob("*.json"):
+                lease = read_json(lease_file)
+                if lease is None or lease["expires"] > now:
+                    continue
+                print(f"[Queue] Lease de '{lease['job']['id']}' expirado ({lease['worker']}), se reclama.")
+                self._retry_or_fail(lease["job"], f"Lease expirado ({lease['worker']})")
+                os.remove(lease_file)
+
+    def claim(self, worker_id: str):
+        """Toma el siguiente trabajo pendiente; devuelve su lease o None."""
+        self.reclaim_expired()
+        with file_lock(self.lock_path):
+            for job_file in sorted(self.pending_path.glob("*.json")):
+                job = read_json(job_file)
+                # Un trabajo espera mientras alguno de los que requiere siga pendiente o en curso
+                if job is None or any(self._is_active(required) for required in job.get("requires", [])):
+                    continue
+                job["attempts"] += 1
+                lease = {
+                    "job": job,
+                    "worker": worker_id,
+                    "token": uuid.uuid4().hex,
+                    "expires": time.time() + self.lease_seconds,
+                }
+                write_json(self.leases_path / job_file.name, lease, indent=4)
+                os.remove(job_file)
+                return lease
+        return None
+
+    def is_empty(self) -> bool:
+        """Indica si no queda ningún trabajo pendiente ni en curso."""
+        with file_lock(self.lock_path):
+            return not any(self.pending_path.glob("*.json")) and not any(self.leases_path.glob("*.json"))
+
+    def _owns(self, lease) -> bool:
+        """Indica si el lease sigue siendo de este worker (llamar con el lock tomado)."""
+        current = read_json(self.leases_path / f"{lease['job']['id']}.json")
+        return current is not None and current["token"] == lease["token"]
+
+    def renew(self, lease) -> bool:
+        """Extiende el lease; devuelve False si otro worker lo reclamó."""
+        with file_lock(self.lock_path):
+            if not self._owns(lease):
+                return False
+            lease["expires"] = time.time() + self.lease_seconds
+            write_json(self.leases_path / f"{lease['job']['id']}.json", lease, indent=4)
+        return True
+
+    def commit(self, lease, tmp_path, final_path) -> bool:
+        """Publica un resultado de forma atómica solo si el lease sigue vigente."""
+        with file_lock(self.lock_path):
+            if not self._owns(lease):
+                print(f"[Queue] Lease de '{lease['job']['id']}' perdido, se descarta '{tmp_path}'.")
+                return False
+            os.replace(tmp_path, final_path)
+        return True
+
+    def complete(self, lease):
+        """Marca el trabajo como terminado."""
+        with file_lock(self.lock_path):
+            if self._owns(lease):
+                write_json(self.done_path / f"{lease['job']['id']}.json", lease, indent=4)
+                os.remove(self.leases_path / f"{lease['job']['id']}.json")
+
+    def fail(self, lease, error: str):
+        """Devuelve el trabajo a pending/, o lo pasa a failed/ tras MAX_ATTEMPTS."""
+        with file_lock(self.lock_path):
+            if not self._owns(lease):
+                return
+            self._retry_or_fail(lease["job"], error)
+            os.remove(self.leases_path / f"{lease['job']['id']}.json")
@@ -0,0 +1,92 @@
+import os
+
+import build_manifest
+from build_manifest import BuildManifest
+
+
+def _count_hashes(monkeypatch):
+    """Cuenta las veces que el manifiesto tiene que hashear un archivo."""
+    calls = []
+    file_hash = build_manifest._file_hash
+
+    def counting_hash(path):
+        calls.append(str(path))
+        return file_hash(path)
+
+    monkeypatch.setattr(build_manifest, "_file_hash", counting_hash)
+    return calls
+
+
+def test_unchanged_files_are_fresh_with_stat_only(tmp_path, monkeypatch):
+    source = tmp_path / "audio.wav"
+    target = tmp_path / "audio.pickle"
+    source.write_text("audio")
+    target.write_text("caption")
+    manifest = BuildManifest(tmp_path / "manifest.json")
+    manifest.record(target, [source], "v1")
+    manifest.save()
+
+    hashes = _count_hashes(monkeypatch)
+    manifest = BuildManifest(tmp_path / "manifest.json")
+    assert manifest.is_fresh(target, [source], "v1")
+    assert hashes == []
+    assert not manifest.is_fresh(target, [source], "v2")
+    assert not manifest.is_fresh(target, [], "v1")
+
+
+def test_touched_file_is_rehashed_once(tmp_path, monkeypatch):
+    source = tmp_path / "audio.wav"
+    target = tmp_path / "audio.pickle"
+    source.write_text("audio")
+    target.write_text("caption")
+    manifest = BuildManifest(tmp_path / "manifest.json")
+    manifest.record(target, [source], "v1")
+    manifest.save()
+
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    hashes = _count_hashes(monkeypatch)
+    manifest = BuildManifest(tmp_path / "manifest.json")
+    assert manifest.is_fresh(target, [source], "v1")
+    assert hashes == [str(source)]
+    manifest.save()
+
+    # El nuevo mtime quedó guardado: la siguiente comprobación vuelve a ser solo stat
+    manifest = BuildManifest(tmp_path / "manifest.json")
+    assert manifest.is_fresh(target, [source], "v1")
+    assert hashes == [str(source)]
+
+
+def test_changed_content_is_stale(tmp_path):
+    source = tmp_path / "audio.wav"
+    target = tmp_path / "audio.pickle"
+    source.write_text("audio")
+    target.write_text("caption")
+    manifest = BuildManifest(tmp_path / "manifest.json")
+    manifest.record(target, [source], "v1")
+
+    source.write_text("otro audio")
+    assert not manifest.is_fresh(target, [source], "v1")
+    target.unlink()
+    assert not manifest.is_fresh(target, [source], "v1")
+
+
+def test_concurrent_saves_are_merged(tmp_path):
+    for name in ("a", "b", "c"):
+        (tmp_path / name).write_text(name)
+    path = tmp_path / "manifest.json"
+    first = BuildManifest(path)
+    first.record(tmp_path / "c", version="v1")
+    first.save()
+
+    first = BuildManifest(path)
+    second = BuildManifest(path)
+    first.record(tmp_path / "a", version="v1")
+    second.record(tmp_path / "b", version="v1")
+    second.forget(tmp_path / "c")
+    first.save()
+    second.save()
+
+    merged = BuildManifest(path)
+    assert sorted(merged.entries) == [str(tmp_path / "a"), str(tmp_path / "b")]
+    assert not list(tmp_path.glob(".*.tmp*"))
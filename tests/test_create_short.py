@@ -0,0 +1,128 @@
+import json
+import random
+from pathlib import Path
+
+import pytest
+
+import create_short
+from create_short import (MAX_SEGMENT_DURATION, MIN_SEGMENT_DURATION, SEGMENT_ATTEMPTS, accountConfig,
+                          choose_segments, create_short as run_create_short, draw_plan, load_plan, save_plan)
+from video_features import FeatureIndex, window_penalty
+from test_video_features import make_seconds
+
+ACCOUNT = {"name": "acc", "language": "es", "type": "Shorts",
+           "edition": {"type": "gameplay", "content": "minecraft"}}
+
+
+class _FakeConcatenation:
+    """Sustituye al render de moviepy: escribe los segmentos en el archivo de salida."""
+
+    fps = 30
+
+    def __init__(self, segments):
+        self.segments = segments
+
+    def write_videofile(self, path, **kwargs):
+        Path(path).write_text(json.dumps(self.segments))
+
+
+@pytest.fixture
+def account_tree(tmp_path, monkeypatch):
+    """Árbol de trabajo con dos videos para la cuenta y un render falso."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(create_short, "get_concatenation_clips",
+                        lambda segments, target_resolution=None: _FakeConcatenation(segments))
+    config = accountConfig(ACCOUNT)
+    config.video_folder_path.mkdir(parents=True)
+    for name in ("a.mp4", "b.mp4"):
+        (config.video_folder_path / name).write_text(name)
+    Path("output").mkdir()
+    return config
+
+
+def test_plan_round_trip(tmp_path):
+    video = tmp_path / "a.mp4"
+    video.write_text("a")
+    plan = draw_plan([str(video)], FeatureIndex(tmp_path / "features.json"), plan_id="p1")
+    save_plan(tmp_path / "acc.plan.json", plan)
+
+    assert load_plan(tmp_path / "acc.plan.json") == plan
+    assert load_plan(tmp_path / "missing.plan.json") is None
+    assert not list(tmp_path.glob(".*.tmp*"))
+
+
+def test_plan_with_missing_video_is_rejected(tmp_path):
+    save_plan(tmp_path / "acc.plan.json",
+              {"id": "p1", "segments": [{"file": str(tmp_path / "gone.mp4"), "start": 0, "duration": 5}]})
+    with pytest.raises(FileNotFoundError, match="--new-plan"):
+        load_plan(tmp_path / "acc.plan.json")
+
+
+def test_final_render_reuses_and_consumes_the_preview_plan(account_tree):
+    run_create_short([ACCOUNT], preview=True)
+    plan = load_plan(Path("output/acc.plan.json"))
+    assert Path(f"output/acc_{plan['id']}_preview.mp4").exists()
+
+    run_create_short([ACCOUNT])
+    final = Path(f"output/acc_{plan['id']}.mp4")
+    assert json.loads(final.read_text()) == plan["segments"]
+    assert not Path("output/acc.plan.json").exists()
+
+
+def test_stale_plan_is_skipped_unless_new_plan(account_tree, capsys):
+    stale = {"id": "stale", "segments": [{"file": str(account_tree.video_folder_path / "gone.mp4"),
+                                          "start": 0, "duration": 5}]}
+    save_plan(Path("output/acc.plan.json"), stale)
+
+    run_create_short([ACCOUNT])
+    assert "--new-plan" in capsys.readouterr().out
+    assert not list(Path("output").glob("acc_*.mp4"))
+
+    run_create_short([ACCOUNT], new_plan=True)
+    outputs = list(Path("output").glob("acc_*.mp4"))
+    assert len(outputs) == 1 and outputs[0].name != "acc_stale.mp4"
+    # El plan viejo no se usó, así que sigue guardado
+    assert Path("output/acc.plan.json").exists()
+
+
+def _index_with(tmp_path, videos):
+    feature_index = FeatureIndex(tmp_path / "features.json")
+    for video_file, seconds in videos.items():
+        feature_index.set(video_file, seconds)
+    return feature_index
+
+
+def test_segments_stay_inside_each_video(tmp_path):
+    lengths = {"short.mp4": 8, "long.mp4": 60}
+    feature_index = _index_with(tmp_path, {name: make_seconds(count) for name, count in lengths.items()})
+    for _ in range(50):
+        for segment in choose_segments(sorted(lengths), feature_index):
+            assert segment["start"] >= 0
+            assert MIN_SEGMENT_DURATION <= segment["duration"] <= MAX_SEGMENT_DURATION
+            assert segment["start"] + segment["duration"] <= lengths[segment["file"]] - 1
+
+
+def test_least_penalized_window_is_kept(tmp_path, monkeypatch):
+    # Solo los segundos 20 a 29 son claros: casi todas las ventanas sorteadas tienen defectos
+    seconds = make_seconds(60)
+    for index, features in enumerate(seconds):
+        if not 20 <= index < 30:
+            features["brightness"] = 0.0
+    draws = []
+    def recording_randint(a, b):
+        draws.append(random.randint(a, b))
+        return draws[-1]
+    monkeypatch.setattr(create_short, "randint", recording_randint)
+
+    random.seed(1)
+    [segment] = choose_segments(["a.mp4"], _index_with(tmp_path, {"a.mp4": seconds}))
+    windows = list(zip(draws[1::2], draws[0::2]))
+    best = min(window_penalty(seconds, start, duration) for start, duration in windows)
+    assert len(windows) == SEGMENT_ATTEMPTS or best == 0
+    assert window_penalty(seconds, segment["start"], segment["duration"]) == best
+
+
+def test_videos_shorter_than_a_segment_are_skipped(tmp_path):
+    feature_index = _index_with(tmp_path, {"tiny.mp4": make_seconds(MIN_SEGMENT_DURATION),
+                                           "ok.mp4": make_seconds(20)})
+    assert [segment["file"] for segment in choose_segments(["tiny.mp4", "ok.mp4"], feature_index)] == ["ok.mp4"]
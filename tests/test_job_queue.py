@@ -0,0 +1,134 @@
+import os
+import time
+import threading
+import multiprocessing
+from pathlib import Path
+
+from build_manifest import file_lock
+from job_queue import JobQueue, MAX_ATTEMPTS
+
+
+def _stub_worker(queue_path, output_path, worker_id, lease_seconds):
+    """Worker de prueba: publica un archivo por trabajo y anota lo que publicó."""
+    queue = JobQueue(Path(queue_path), lease_seconds)
+    output_path = Path(output_path)
+    committed = []
+    while True:
+        lease = queue.claim(worker_id)
+        if lease is None:
+            break
+        job_id = lease["job"]["id"]
+        time.sleep(0.01)
+        tmp_path = output_path / f".{job_id}.{worker_id}.tmp"
+        tmp_path.write_text(worker_id)
+        if queue.commit(lease, tmp_path, output_path / job_id):
+            committed.append(job_id)
+            queue.complete(lease)
+    (output_path / f"{worker_id}.log").write_text("\n".join(committed))
+
+def _crashing_worker(queue_path, lease_seconds):
+    """Toma un trabajo y muere sin terminarlo ni liberarlo."""
+    JobQueue(Path(queue_path), lease_seconds).claim("crash")
+    os._exit(0)
+
+def _run(target, *args):
+    process = multiprocessing.get_context("spawn").Process(target=target, args=args)
+    process.start()
+    return process
+
+
+def test_each_job_is_committed_exactly_once(tmp_path):
+    queue = JobQueue(tmp_path / "Queue")
+    output_path = tmp_path / "output"
+    output_path.mkdir()
+    job_ids = [f"render_acc_{i:02d}" for i in range(40)]
+    for job_id in job_ids:
+        assert queue.enqueue(job_id, "render")
+    assert not queue.enqueue(job_ids[0], "render")
+
+    workers = [_run(_stub_worker, str(queue.path), str(output_path), f"w{i}", 30) for i in range(4)]
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    committed = []
+    for i in range(4):
+        committed += [line for line in (output_path / f"w{i}.log").read_text().splitlines() if line]
+    assert sorted(committed) == job_ids
+    assert sorted(f.stem for f in queue.done_path.glob("*.json")) == job_ids
+    assert not list(queue.pending_path.glob("*.json"))
+    assert not list(queue.leases_path.glob("*.json"))
+    assert sorted(f.name for f in output_path.iterdir() if not f.name.endswith(".log")) == job_ids
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    queue = JobQueue(tmp_path / "Queue", lease_seconds=0.2)
+    queue.enqueue("render_acc_00", "render")
+
+    crashed = _run(_crashing_worker, str(queue.path), 0.2)
+    crashed.join(30)
+    assert queue.claim("w1") is None  # el lease del worker caído sigue vigente
+
+    time.sleep(0.3)
+    lease = queue.claim("w1")
+    assert lease is not None
+    assert lease["job"]["id"] == "render_acc_00"
+    assert lease["job"]["attempts"] == 2
+
+
+def test_stale_lease_cannot_commit(tmp_path):
+    queue = JobQueue(tmp_path / "Queue", lease_seconds=0.1)
+    queue.enqueue("render_acc_00", "render")
+    stale = queue.claim("slow")
+    time.sleep(0.2)
+    fresh = queue.claim("fast")
+
+    (tmp_path / "slow.tmp").write_text("slow")
+    (tmp_path / "fast.tmp").write_text("fast")
+    assert not queue.renew(stale)
+    assert not queue.commit(stale, tmp_path / "slow.tmp", tmp_path / "final")
+    assert queue.commit(fresh, tmp_path / "fast.tmp", tmp_path / "final")
+    assert (tmp_path / "final").read_text() == "fast"
+
+
+def test_expired_leases_stop_after_max_attempts(tmp_path):
+    queue = JobQueue(tmp_path / "Queue", lease_seconds=0.05)
+    queue.enqueue("render_acc_00", "render")
+    for _ in range(MAX_ATTEMPTS):
+        assert queue.claim("crash") is not None
+        time.sleep(0.1)
+
+    assert queue.claim("w1") is None
+    assert (queue.failed_path / "render_acc_00.json").exists()
+
+
+def test_job_waits_for_its_requirements(tmp_path):
+    queue = JobQueue(tmp_path / "Queue")
+    queue.enqueue("render_acc_00", "render", requires=["ingest_video_abc"])
+    queue.enqueue("ingest_video_abc", "ingest_video")
+
+    ingest = queue.claim("w1")
+    assert ingest["job"]["id"] == "ingest_video_abc"
+    assert queue.claim("w2") is None
+
+    queue.complete(ingest)
+    assert queue.claim("w2")["job"]["id"] == "render_acc_00"
+
+
+def test_file_lock_is_exclusive_between_threads(tmp_path):
+    inside = []
+    overlaps = []
+
+    def hold():
+        with file_lock(tmp_path / ".lock"):
+            inside.append(1)
+            overlaps.append(len(inside))
+            time.sleep(0.05)
+            inside.pop()
+
+    threads = [threading.Thread(target=hold) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == [1, 1, 1, 1]
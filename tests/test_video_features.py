@@ -0,0 +1,45 @@
+import random
+
+import numpy as np
+
+from video_features import MIN_BRIGHTNESS, _average_hash, hash_distance, window_penalty
+
+
+def make_seconds(count, seed=0):
+    """Features sintéticas: segundos claros, con movimiento y planos distintos."""
+    rng = random.Random(seed)
+    return [{"brightness": 0.5, "motion": 0.1, "cut": False, "phash": f"{rng.getrandbits(64):016x}"}
+            for _ in range(count)]
+
+
+def test_average_hash_of_half_bright_frame():
+    gray = np.zeros((64, 32))
+    gray[:, 16:] = 1.0
+    assert _average_hash(gray) == "0f" * 8
+    assert hash_distance(_average_hash(gray), _average_hash(1.0 - gray)) == 64
+    assert hash_distance("0f" * 8, "0f" * 7 + "0e") == 1
+
+
+def test_clean_window_has_no_penalty():
+    assert window_penalty(make_seconds(10), 2, 5) == 0
+
+
+def test_window_must_fit_in_the_video():
+    seconds = make_seconds(10)
+    assert window_penalty(seconds, 6, 5) == float("inf")
+    assert window_penalty(seconds, -1, 5) == float("inf")
+    assert window_penalty(seconds, 5, 5) == 0
+
+
+def test_window_defects_are_counted():
+    seconds = make_seconds(10)
+    seconds[2]["cut"] = True
+    seconds[3]["brightness"] = MIN_BRIGHTNESS / 2
+    assert window_penalty(seconds, 2, 5) == 2
+    assert window_penalty(seconds, 3, 5) == 1
+    assert window_penalty(seconds, 4, 5, used_hashes={seconds[5]["phash"], seconds[6]["phash"]}) == 2
+
+    static = make_seconds(10)
+    for features in static:
+        features["motion"] = 0.0
+    assert window_penalty(static, 0, 5) == 5
@@ -0,0 +1,60 @@
+import time
+import threading
+from pathlib import Path
+
+import worker
+from config_env import accountConfig
+from job_queue import JobQueue
+
+ACCOUNT = {"name": "acc", "language": "es", "type": "Shorts",
+           "edition": {"type": "gameplay", "content": "minecraft"}}
+
+
+def test_worker_waits_for_a_render_blocked_by_another_workers_ingest(tmp_path, monkeypatch):
+    queue = JobQueue(tmp_path / "Queue")
+    queue.enqueue("ingest_video_abc", "ingest_video")
+    queue.enqueue("render_acc_00", "render", requires=["ingest_video_abc"])
+    ran = []
+    monkeypatch.setattr(worker, "POLL_SECONDS", 0.01)
+    monkeypatch.setattr(worker, "run_job", lambda queue, lease, accounts: ran.append(lease["job"]["id"]))
+
+    # Otro worker tiene el ingest en curso: el render aún no se puede tomar
+    ingest = queue.claim("other")
+    second = threading.Thread(target=worker.work, args=(queue, [ACCOUNT]))
+    second.start()
+    time.sleep(0.2)
+    assert second.is_alive()
+    assert ran == []
+
+    queue.complete(ingest)
+    second.join(10)
+    assert not second.is_alive()
+    assert ran == ["render_acc_00"]
+    assert queue.is_empty()
+
+
+def test_mp3_is_converted_before_transcribing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config = accountConfig(ACCOUNT)
+    config.audio_folder_path.mkdir(parents=True)
+    config.video_folder_path.mkdir(parents=True)
+    (config.audio_folder_path / "song.mp3").write_text("mp3")
+    (config.audio_folder_path / "song.mp3.part").write_text("descarga a medias")
+
+    def fake_convert(audio_file):
+        Path(audio_file).with_suffix(".wav").write_text("wav")
+        Path(audio_file).unlink()
+    transcribed = []
+    monkeypatch.setattr(worker, "convert_to_wav", fake_convert)
+    monkeypatch.setattr(worker, "transcribe_audio",
+                        lambda config, audio_file, manifest: transcribed.append(audio_file))
+
+    queue = JobQueue(tmp_path / "Queue")
+    worker.enqueue(queue, [ACCOUNT], "ingest")
+    jobs = [path.stem for path in queue.pending_path.glob("*.json")]
+    assert len(jobs) == 1
+
+    lease = queue.claim("w1")
+    worker.run_job(queue, lease, [ACCOUNT])
+    assert transcribed == [str(config.audio_folder_path / "song.wav")]
+    assert not (config.audio_folder_path / "song.mp3").exists()
@@ -0,0 +1,143 @@
+from pathlib import Path
+from build_manifest import read_json, merge_json
+
+import numpy as np
+
+FEATURES_VERSION = "features:v1"
+
+# Muestreo a baja resolución: (alto, ancho), como espera target_resolution
+SAMPLE_RESOLUTION = (64, 32)
+SAMPLE_FPS = 4
+HASH_SIZE = 8
+
+CUT_THRESHOLD = 0.25        # diferencia media entre frames que se considera corte
+MIN_BRIGHTNESS = 0.08       # por debajo, el segundo es (casi) negro
+MIN_MOTION = 0.004          # por debajo, el segundo es una imagen estática
+MAX_HASH_DISTANCE = 6       # bits distintos para considerar dos planos repetidos
+
+
+def _gray(frame) -> np.ndarray:
+    """Convierte un frame RGB a luminancia en [0, 1]."""
+    return (frame[..., :3] @ np.array([0.299, 0.587, 0.114])) / 255.0
+
+def _average_hash(gray: np.ndarray) -> str:
+    """Hash perceptual (aHash) de 64 bits en hexadecimal."""
+    h, w = gray.shape
+    blocks = gray[:h - h % HASH_SIZE, :w - w % HASH_SIZE]
+    blocks = blocks.reshape(HASH_SIZE, h // HASH_SIZE, HASH_SIZE, w // HASH_SIZE).mean(axis=(1, 3))
+    bits = (blocks > blocks.mean()).flatten()
+    return f"{int(''.join('1' if b else '0' for b in bits), 2):016x}"
+
+def hash_distance(hash_a: str, hash_b: str) -> int:
+    """Número de bits distintos entre dos hashes perceptuales."""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+def analyze_video(video_file) -> list:
+    """Calcula brillo, movimiento, cortes y hash perceptual por segundo de video."""
+    from moviepy.editor import VideoFileClip
+
+    clip = VideoFileClip(str(video_file), audio=False, target_resolution=SAMPLE_RESOLUTION)
+    seconds = []
+    previous = None
+    try:
+        for index, frame in enumerate(clip.iter_frames(fps=SAMPLE_FPS, dtype="uint8")):
+            second = index // SAMPLE_FPS
+            gray = _gray(frame)
+            diff = float(np.abs(gray - previous).mean()) if previous is not None else 0.0
+            previous = gray
+
+            if second == len(seconds):
+                seconds.append({"brightness": 0.0, "motion": 0.0, "cut": False,
+                                "phash": _average_hash(gray), "_frames": 0})
+            features = seconds[second]
+            features["brightness"] += float(gray.mean())
+            features["motion"] += diff
+            features["cut"] = features["cut"] or diff > CUT_THRESHOLD
+            features["_frames"] += 1
+    finally:
+        clip.close()
+
+    for features in seconds:
+        frames = features.pop("_frames")
+        features["brightness"] = round(features["brightness"] / frames, 4)
+        features["motion"] = round(features["motion"] / frames, 4)
+    return seconds
+
+def window_penalty(seconds, start, duration, used_hashes=()) -> float:
+    """Cuenta los defectos de la ventana [start, start + duration); 0 es una ventana limpia.
+
+    Suma uno por cada segundo negro o que repite un plano ya elegido (por hash
+    perceptual) y otro si la ventana empieza en un corte; una ventana estática
+    cuenta como si todos sus segundos fueran malos. Las que no caben en el
+    video no son elegibles.
+    """
+    window = seconds[start:start + duration]
+    if start < 0 or len(window) < duration:
+        return float("inf")
+    penalty = sum(1 for s in window if s["brightness"] < MIN_BRIGHTNESS)
+    penalty += sum(1 for s in window
+                   if any(hash_distance(s["phash"], used) <= MAX_HASH_DISTANCE for used in used_hashes))
+    if sum(s["motion"] for s in window) / len(window) < MIN_MOTION:
+        penalty += len(window)
+    if window[0]["cut"]:
+        penalty += 1
+    return penalty
+
+
+def _read_videos(path: Path) -> dict:
+    """Lee los videos de un índice; se descarta si es de otra versión o está dañado."""
+    data = read_json(path)
+    if not isinstance(data, dict) or data.get("version") != FEATURES_VERSION:
+        return {}
+    return data.get("videos", {})
+
+
+class FeatureIndex:
+    """Índice de features visuales por segundo de cada video de una carpeta.
+
+    El JSON solo se lee la primera vez que se consulta: guardar features de
+    un video no obliga a cargar las del resto.
+    """
+
+    def __init__(self, path: Path):
+        """Prepara el índice sin leerlo todavía de disco."""
+        self.path = Path(path)
+        self._videos = None
+        self._changes = {}
+
+    @property
+    def videos(self) -> dict:
+        """Features de todos los videos, con los cambios aún sin guardar."""
+        if self._videos is None:
+            self._videos = _read_videos(self.path)
+            for video_file, seconds in self._changes.items():
+                if seconds is None:
+                    self._videos.pop(video_file, None)
+                else:
+                    self._videos[video_file] = seconds
+        return self._videos
+
+    def get(self, video_file):
+        """Features por segundo de un video, o None si no se ha analizado."""
+        return self.videos.get(str(video_file))
+
+    def set(self, video_file, seconds):
+        """Guarda las features de un video."""
+        if self._videos is not None:
+            self._videos[str(video_file)] = seconds
+        self._changes[str(video_file)] = seconds
+
+    def prune(self, video_files):
+        """Elimina del índice los videos que ya no están en la carpeta."""
+        keep = {str(f) for f in video_files}
+        for video_file in [v for v in self.videos if v not in keep]:
+            del self.videos[video_file]
+            self._changes[video_file] = None
+
+    def save(self):
+        """Escribe de forma atómica los cambios sobre la versión en disco."""
+        if not self._changes:
+            return
+        self._videos = merge_json(self.path, self._changes, _read_videos,
+                                  lambda videos: {"version": FEATURES_VERSION, "videos": videos})
+        self._changes = {}
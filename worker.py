@@ -0,0 +1,147 @@
+from pathlib import Path
+from build_manifest import BuildManifest
+from job_queue import JobQueue
+from video_features import FeatureIndex
+from create_short import load_accounts, render_account
+from config_env import accountConfig, convert_to_wav, transcribe_audio, normalize_video, media_files
+
+import os
+import sys
+import time
+import uuid
+import socket
+import hashlib
+import threading
+
+JOB_KINDS = ["ingest", "render", "preview"]
+POLL_SECONDS = 5
+
+
+def _heartbeat(queue: JobQueue, lease, stop: threading.Event):
+    """Renueva el lease mientras el trabajo sigue en curso."""
+    while not stop.wait(queue.lease_seconds / 3):
+        if not queue.renew(lease):
+            print(f"[Worker] Lease de '{lease['job']['id']}' perdido.")
+            return
+
+def _file_job_id(kind: str, path) -> str:
+    """Id estable de un trabajo sobre un archivo, el mismo para todas las cuentas que lo comparten."""
+    return f"{kind}_{hashlib.sha1(str(path).encode('utf-8')).hexdigest()[:12]}"
+
+def run_job(queue: JobQueue, lease, accounts):
+    """Ejecuta un trabajo de la cola para su cuenta."""
+    job = lease["job"]
+    account = next((a for a in accounts if a["name"] == job["account"]), None)
+    if account is None:
+        raise ValueError(f"La cuenta '{job['account']}' no está en la configuración")
+
+    config = accountConfig(account)
+    manifest = BuildManifest()
+    if job["kind"] == "ingest_audio":
+        # Las descargas llegan en mp3: se transcribe el wav, convirtiéndolo si nadie lo hizo aún
+        wav_file = str(Path(job["file"]).with_suffix(".wav"))
+        if job["file"].endswith(".mp3") and os.path.exists(job["file"]):
+            convert_to_wav(job["file"])
+        try:
+            transcribe_audio(config, wav_file, manifest)
+        finally:
+            manifest.save()
+    elif job["kind"] == "ingest_video":
+        feature_index = FeatureIndex(config.features_index_path)
+        try:
+            normalize_video(job["file"], manifest, feature_index)
+        finally:
+            feature_index.save()
+            manifest.save()
+    elif job["kind"] in ("render", "preview"):
+        render_account(account, manifest, preview=job["kind"] == "preview",
+                       new_plan=job["new_plan"], plan_id=job["plan_id"],
+                       commit=lambda tmp_path, final_path: queue.commit(lease, tmp_path, final_path))
+    else:
+        raise ValueError(f"Tipo de trabajo no soportado: {job['kind']}")
+
+def work(queue: JobQueue, accounts, follow=False):
+    """Procesa trabajos hasta vaciar la cola (o indefinidamente con `follow`).
+
+    Sin `follow` el worker solo termina cuando no queda nada pendiente ni en
+    curso: los trabajos que esperan a sus `requires` se vuelven a intentar.
+    """
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    while True:
+        lease = queue.claim(worker_id)
+        if lease is None:
+            if not follow and queue.is_empty():
+                break
+            time.sleep(POLL_SECONDS)
+            continue
+
+        print(f"[Worker] {worker_id} toma '{lease['job']['id']}'")
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat, args=(queue, lease, stop), daemon=True)
+        heartbeat.start()
+        try:
+            run_job(queue, lease, accounts)
+            error = None
+        except Exception as e:
+            error = str(e)
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        if error is None:
+            queue.complete(lease)
+        else:
+            print(f"[Worker] Error en '{lease['job']['id']}': {error}")
+            queue.fail(lease, error)
+
+def enqueue(queue: JobQueue, accounts, kind: str, count=1, new_plan=False):
+    """Encola trabajos de `kind` para cada cuenta.
+
+    `ingest` encola un trabajo por audio (mp3 o wav) y por video; las
+    cuentas que comparten carpeta comparten también esos trabajos. `render`
+    encola `count` shorts por cuenta, cada uno con su propio plan y salida,
+    y `preview` uno; ambos esperan a los ingest de los videos de la cuenta.
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Tipo de trabajo no soportado: {kind}")
+
+    for account in accounts:
+        config = accountConfig(account)
+        video_files = media_files(config.video_folder_path)
+
+        if kind == "ingest":
+            for audio_file in media_files(config.audio_folder_path):
+                if not audio_file.endswith((".wav", ".mp3")):
+                    continue
+                queue.enqueue(_file_job_id("ingest_audio", audio_file), "ingest_audio",
+                              account=account["name"], file=audio_file)
+            for video_file in video_files:
+                queue.enqueue(_file_job_id("ingest_video", video_file), "ingest_video",
+                              account=account["name"], file=video_file)
+            continue
+
+        requires = [_file_job_id("ingest_video", video_file) for video_file in video_files]
+        for index in range(count if kind == "render" else 1):
+            plan_id = uuid.uuid4().hex[:8]
+            # Solo el primero puede usar el plan guardado por un preview: el resto sortea el suyo
+            queue.enqueue(f"{kind}_{account['name']}_{plan_id}", kind, requires=requires,
+                          account=account["name"], plan_id=plan_id, new_plan=new_plan or index > 0)
+
+
+if __name__ == "__main__":
+    # python worker.py enqueue ingest
+    # python worker.py enqueue render [N] [--new-plan]
+    # python worker.py enqueue preview [--new-plan]
+    # python worker.py work [--follow]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if not args or args[0] not in ("enqueue", "work"):
+        raise SystemExit("Uso: python worker.py enqueue <ingest|render [N]|preview> [--new-plan] | work [--follow]")
+
+    queue = JobQueue()
+    accounts = load_accounts()
+    if args[0] == "enqueue":
+        kind = args[1] if len(args) > 1 else "render"
+        count = int(args[2]) if len(args) > 2 else 1
+        enqueue(queue, accounts, kind, count=count, new_plan="--new-plan" in sys.argv)
+    else:
+        work(queue, accounts, follow="--follow" in sys.argv)